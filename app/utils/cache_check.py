@@ -0,0 +1,104 @@
+# app/utils/cache_check.py
+"""共有キャッシュのプロセス間重複排除を確認するハーネス
+
+複数のワーカープロセスを同時に起動して同じキーを get_or_create() し、
+生成処理が 1 回だけ実行され、全ワーカーが同じ値を受け取ることを確認する。
+--fail を付けると生成処理を失敗させ、待っていたワーカーが再実行せずに失敗し、
+失敗の後に来たリクエストは改めて生成できることを確認する。
+
+    python -m app.utils.cache_check --workers 8
+    python -m app.utils.cache_check --workers 8 --fail
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.utils.shared_cache import TieredCache, make_key
+
+
+def _worker(cache_dir: str, key: str, build_seconds: float, fail: bool, start, results) -> None:
+    """1 ワーカー分の処理（起動を揃えてから同じキーを取得する）"""
+    cache = TieredCache(cache_dir)
+
+    def build() -> str:
+        # 生成回数を数えるため、生成のたびに 1 行追記する
+        with open(os.path.join(cache_dir, "builds.log"), "a") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(build_seconds)
+        if fail:
+            raise ValueError(f"failed-by-{os.getpid()}")
+        return f"built-by-{os.getpid()}"
+
+    start.wait()
+    try:
+        results.put(("ok", cache.get_or_create(key, build)))
+    except Exception as e:
+        results.put(("error", str(e)))
+
+
+def run_check(workers: int, build_seconds: float = 0.5, fail: bool = False) -> dict:
+    """ワーカーを同時に起動し、生成回数と受け取った値を集計する
+
+    Args:
+        workers: 起動するプロセス数
+        build_seconds: 1 回の生成にかかる時間（重なりを作るための待ち時間）
+        fail: True なら生成処理を失敗させる
+    Returns:
+        dict: 集計結果
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        key = make_key("cache_check", time.time())
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(cache_dir, key, build_seconds, fail, start, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        values = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+
+        with open(os.path.join(cache_dir, "builds.log")) as f:
+            builds = len(f.read().splitlines())
+
+        # 失敗の後に来たリクエストは、失敗を引き継がずに生成し直す
+        retried = TieredCache(cache_dir).get_or_create(key, lambda: "retried") if fail else None
+
+    return {
+        "workers": workers,
+        "builds": builds,
+        "distinct_values": len({value for status, value in values if status == "ok"}),
+        "errors": sum(1 for status, _ in values if status == "error"),
+        "retried": retried,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共有キャッシュのプロセス間重複排除を確認する")
+    parser.add_argument("--workers", type=int, default=4, help="起動するプロセス数")
+    parser.add_argument("--build-seconds", type=float, default=0.5, help="1 回の生成にかかる時間")
+    parser.add_argument("--fail", action="store_true", help="生成処理を失敗させる")
+    args = parser.parse_args()
+
+    report = run_check(args.workers, args.build_seconds, args.fail)
+    print(f"workers:         {report['workers']}")
+    print(f"builds:          {report['builds']}")
+    print(f"distinct values: {report['distinct_values']}")
+    print(f"errors:          {report['errors']}")
+    if report["builds"] != 1:
+        raise SystemExit("生成処理が重複しました")
+    if args.fail and report["errors"] != report["workers"]:
+        raise SystemExit("失敗が全ワーカーに伝わっていません")
+    if args.fail and report["retried"] != "retried":
+        raise SystemExit("失敗の後のリクエストで生成し直せません")
+    if not args.fail and (report["distinct_values"] != 1 or report["errors"]):
+        raise SystemExit("ワーカー間で値が一致しません")
+
+
+if __name__ == "__main__":
+    main()
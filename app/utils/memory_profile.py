@@ -0,0 +1,206 @@
+# app/utils/memory_profile.py
+"""セッションあたりのメモリ使用量を計測するハーネス
+
+Streamlit の AppTest で N セッション分の診断フローを実行し、
+tracemalloc による増分とセッションステートのキーごとのサイズを出力する。
+
+    python -m app.utils.memory_profile --sessions 50
+
+セッションあたりの使用量が上限を超えた場合は終了コード 1 で失敗する。
+LLM 呼び出しは固定サイズのダミー結果に置き換えるため API キーは不要。
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Optional
+from unittest import mock
+
+from streamlit.testing.v1 import AppTest
+
+# rag_handler の import 時に OpenAI クライアントが生成されるため、未設定ならダミーキーを入れる
+os.environ.setdefault("OPENAI_API_KEY", "sk-memory-profile")
+
+from app.schemas.appraisal import Employee
+from app.schemas.course import CourseRecommendation
+from app.utils import session_store
+
+QUESTION_COUNT = 4
+# 計測前に空回しするセッション数
+WARMUP_SESSIONS = 10
+# セッションあたりの上限（README の「セッションあたりのメモリ」に記載の値）
+MAX_BYTES_PER_SESSION = 96 * 1024
+MAX_IDLE_BYTES_PER_SESSION = 48 * 1024
+
+
+def _questionnaire_app():
+    """AppTest で実行するスクリプト（質問票のみを表示）"""
+    from app.utils.questionnaire import display_questionnaire
+
+    display_questionnaire()
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """オブジェクトが参照する要素も含めたおおよそのバイト数を返す"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def _click(at: AppTest, label: str) -> None:
+    """ラベルが一致するボタンを押して再実行する"""
+    next(button for button in at.button if button.label == label).click().run()
+
+
+def run_session(at: AppTest) -> AppTest:
+    """プロフィール入力から診断結果表示までを 1 セッション分実行する"""
+    at.run()
+    _click(at, "診断を開始する")
+    for _ in range(QUESTION_COUNT - 1):
+        _click(at, "次の質問 →")
+    _click(at, "回答の判定結果を表示")
+    return at
+
+
+def _state_bytes_by_key(sessions: list) -> dict:
+    """全セッションの st.session_state をキーごとに合計する"""
+    by_key = defaultdict(int)
+    for at in sessions:
+        for key, value in at.session_state.items():
+            by_key[key] += deep_sizeof(value)
+    return by_key
+
+
+def profile_sessions(session_count: int, result_chars: int = 8000) -> dict:
+    """N セッションを実行し、セッションあたりのメモリ使用量を集計する
+
+    active は全セッションが診断結果を表示している状態、idle は診断結果を破棄し、
+    各セッションを 1 回再実行した状態（プロフィール入力画面に戻った状態）の tracemalloc 増分。
+    どちらも AppTest が保持する描画済み要素ツリーを含む。キーごとの値は st.session_state のみ。
+
+    Args:
+        session_count: 同時に保持するセッション数
+        result_chars: ダミー診断結果の文字数
+    Returns:
+        dict: 計測結果
+    """
+    patches = [
+        mock.patch(
+            "app.utils.questionnaire.chain_first_context_generate_response",
+            return_value=Employee(appraisal_type="intermediate_or_above"),
+        ),
+        mock.patch(
+            "app.utils.questionnaire.chain_second_context_generate_response",
+            return_value=CourseRecommendation(appraisal_type="chatgpt"),
+        ),
+        mock.patch(
+            "app.utils.questionnaire.get_ai_response",
+            side_effect=lambda *args, **kwargs: {"text": "診" * result_chars},
+        ),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        # 初回実行時の import やキャッシュの初期化を計測から除外するため、破棄後の再実行まで 1 周しておく
+        warmups = [run_session(AppTest.from_function(_questionnaire_app)) for _ in range(WARMUP_SESSIONS)]
+        session_store.evict_idle_results(now=time.time() + session_store.RESULT_IDLE_TTL_SECONDS + 1)
+        for at in warmups:
+            at.run()
+
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        sessions = [run_session(AppTest.from_function(_questionnaire_app)) for _ in range(session_count)]
+        gc.collect()
+        active, peak = tracemalloc.get_traced_memory()
+        active_by_key = _state_bytes_by_key(sessions)
+
+        # アイドル状態を再現して診断結果を破棄し、各セッションを再実行して
+        # 描画済み要素に残っている診断結果のコピーも手放させる
+        evicted = session_store.evict_idle_results(
+            now=time.time() + session_store.RESULT_IDLE_TTL_SECONDS + 1
+        )
+        for at in sessions:
+            at.run()
+        gc.collect()
+        idle, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        idle_by_key = _state_bytes_by_key(sessions)
+
+        # 破棄後の再実行でプロフィール入力画面に戻れたセッション数
+        returned_to_form = sum(
+            1 for at in sessions if any(button.label == "診断を開始する" for button in at.button)
+        )
+    finally:
+        for patch in patches:
+            patch.stop()
+
+    return {
+        "sessions": session_count,
+        "bytes_per_session": (active - baseline) // session_count,
+        "bytes_per_idle_session": (idle - baseline) // session_count,
+        "peak_bytes": peak - baseline,
+        "evicted_results": evicted,
+        "returned_to_form": returned_to_form,
+        "session_state_bytes_by_key": {
+            key: size // session_count for key, size in sorted(active_by_key.items(), key=lambda item: -item[1])
+        },
+        "idle_session_state_bytes_by_key": {
+            key: size // session_count for key, size in sorted(idle_by_key.items(), key=lambda item: -item[1])
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="セッションあたりのメモリ使用量を計測する")
+    parser.add_argument("--sessions", type=int, default=20, help="同時に保持するセッション数")
+    parser.add_argument("--result-chars", type=int, default=8000, help="ダミー診断結果の文字数")
+    parser.add_argument(
+        "--max-bytes-per-session", type=int, default=MAX_BYTES_PER_SESSION,
+        help="active 時のセッションあたりの上限（超えたら失敗）",
+    )
+    parser.add_argument(
+        "--max-idle-bytes-per-session", type=int, default=MAX_IDLE_BYTES_PER_SESSION,
+        help="idle 時のセッションあたりの上限（超えたら失敗）",
+    )
+    args = parser.parse_args()
+
+    report = profile_sessions(args.sessions, args.result_chars)
+    print(f"sessions:               {report['sessions']}")
+    print(f"bytes/session (active): {report['bytes_per_session']:,}")
+    print(f"bytes/session (idle):   {report['bytes_per_idle_session']:,}")
+    print(f"peak bytes:             {report['peak_bytes']:,}")
+    print(f"evicted results:        {report['evicted_results']}")
+    print(f"returned to form:       {report['returned_to_form']}")
+    print("session_state bytes/session by key (active):")
+    for key, size in report["session_state_bytes_by_key"].items():
+        print(f"  {key:<20} {size:,}")
+    print("session_state bytes/session by key (idle):")
+    for key, size in report["idle_session_state_bytes_by_key"].items():
+        print(f"  {key:<20} {size:,}")
+
+    errors = []
+    if report["bytes_per_session"] > args.max_bytes_per_session:
+        errors.append(f"active 時の使用量が上限 {args.max_bytes_per_session:,} bytes を超えました")
+    if report["bytes_per_idle_session"] > args.max_idle_bytes_per_session:
+        errors.append(f"idle 時の使用量が上限 {args.max_idle_bytes_per_session:,} bytes を超えました")
+    if report["evicted_results"] != report["sessions"]:
+        errors.append("アイドル時に破棄されなかった診断結果があります")
+    if report["returned_to_form"] != report["sessions"]:
+        errors.append("診断結果の破棄後にプロフィール入力画面へ戻れないセッションがあります")
+    if errors:
+        raise SystemExit("\n".join(errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import os
 import streamlit as st
 
 from app.utils.rag_handler import chain_first_context_generate_response, chain_second_context_generate_response, get_ai_response, get_course_image
+from app.utils.session_store import clear_result, load_result, save_result
 
 def display_questionnaire():    
     # セッションステートの初期化を拡張
@@ -46,13 +47,13 @@ def display_questionnaire():
                 result_container.markdown("#### Step 3: 総合診断結果を生成中...")
                 final_response = get_ai_response(st.session_state.responses, st.session_state.user_info)
                 
-                # 結果を保存
-                st.session_state.result = {
+                # 結果を保存（本体はセッションストアに置き、アイドル時に破棄される）
+                save_result({
                     "text": final_response["text"],
                     "level": level_result.appraisal_type,
                     "course": course_info,
                     "course_image_path": course_image_path
-                }
+                })
                 
                 st.session_state.show_result = True
                 st.session_state.is_generating = False
@@ -67,7 +68,17 @@ def display_questionnaire():
 
     # 判定結果の表示
     if st.session_state.show_result:
-        result = st.session_state.result
+        result = load_result()
+        if result is None:
+            # 一定時間操作がなく診断結果が破棄された場合は回答からやり直す
+            st.session_state.question_index = 0
+            st.session_state.responses = {}
+            st.session_state.show_result = False
+            st.session_state.info_submitted = False
+            st.session_state.user_info = {}
+            # 案内は再実行後のプロフィール入力画面で表示する
+            st.session_state.result_expired = True
+            st.rerun()
         
         # 診断結果テキストの表示
         st.markdown("### 診断結果")
@@ -117,7 +128,7 @@ def display_questionnaire():
             st.session_state.responses = {}
             st.session_state.show_result = False
             st.session_state.is_generating = False
-            st.session_state.result = None
+            clear_result()
             st.session_state.info_submitted = False
             st.session_state.user_info = {}
             st.rerun()
@@ -128,6 +139,9 @@ def display_questionnaire():
         st.markdown("### プロフィール情報")
         st.divider()
         
+        if st.session_state.pop("result_expired", False):
+            st.info("一定時間操作がなかったため診断結果を破棄しました。もう一度診断を行ってください。")
+        
         col1, col2 = st.columns(2)
         
         with col1:
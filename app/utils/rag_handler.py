@@ -13,6 +13,7 @@ from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from app.schemas.course import CourseRecommendation
 from app.utils.dict_change_str import format_responses_to_prompt
+from app.utils.shared_cache import get_shared_cache, make_key
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -76,7 +77,12 @@ def chain_first_context_generate_response(user_responses: dict[str, str], user_i
         prompt_first_conversation()
         | llm.with_structured_output(Employee)
     )
-    return context_chain.invoke({"user_info": user_infos, "message": user_prompt})
+    # 同じ入力の判定はワーカー間で共有し、モデル呼び出しは 1 回だけにする
+    # 共有層は JSON で保存するため、dict に変換して保存し読み出し時に戻す
+    return Employee.model_validate(get_shared_cache().get_or_create(
+        make_key("first_context", llm.model_name, user_infos, user_prompt),
+        lambda: context_chain.invoke({"user_info": user_infos, "message": user_prompt}).model_dump(),
+    ))
 
 def chain_second_context_generate_response(user_responses: dict[str, str], user_info: dict = None):
     """ユーザー判断用のchainを返す"""
@@ -92,27 +98,26 @@ def chain_second_context_generate_response(user_responses: dict[str, str], user_
         prompt_second_conversation()  # ここを修正（first_conversationからsecond_conversationに）
         | llm.with_structured_output(CourseRecommendation) 
     )
-    return context_chain.invoke({"user_info": user_infos, "message": user_prompt})
+    return CourseRecommendation.model_validate(get_shared_cache().get_or_create(
+        make_key("second_context", llm.model_name, user_infos, user_prompt),
+        lambda: context_chain.invoke({"user_info": user_infos, "message": user_prompt}).model_dump(),
+    ))
 
+@st.cache_resource(show_spinner=False)
 def initialize_rag() -> str:
     """PDFからテキストを抽出してマークダウン形式で返す"""
-    # すでにテキストが保存されている場合はそれを返す
-    if "markdown_text" in st.session_state:
-        return st.session_state.markdown_text
-    
-    # 初回のみPDFからテキストを抽出
+    # プロセス内では st.cache_resource で保持し続け、診断結果の LRU に押し出されないようにする
+    # 初回の抽出は共有キャッシュ経由で全ワーカーのうち 1 つだけが行う
     current_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     pdf_path = os.path.join(current_dir, "pdf", "【納品用PDF】AI時代のサバイバル診断｜あなたの仕事はAIに奪われる？それとも進化する？.pdf")
     
-    markdown_text = pymupdf4llm.to_markdown(
-        pdf_path,
-        dpi=600
+    return get_shared_cache().get_or_create(
+        make_key("markdown", pdf_path, os.path.getmtime(pdf_path)),
+        lambda: pymupdf4llm.to_markdown(
+            pdf_path,
+            dpi=600
+        ),
     )
-    
-    # 抽出したテキストを保存
-    st.session_state.markdown_text = markdown_text
-    
-    return markdown_text
 def get_course_image(course_type: str) -> str:
     """コースタイプに応じた画像ファイルパスを返す"""
     current_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -130,18 +135,21 @@ def get_course_image(course_type: str) -> str:
     
     return os.path.join(image_dir, image_mapping[course_type])
 
+@st.cache_resource(show_spinner=False)
 def initialize_base64_image() -> str:
-    """PDFの最初のページをbase64画像として保存"""
-    if "base64_image" in st.session_state:
-        return st.session_state.base64_image
-    
+    """PDFの最初のページをbase64画像として返す（全セッション・全ワーカーで共有）"""
     current_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     pdf_path = os.path.join(current_dir, "pdf", "【納品用PDF】AI時代のサバイバル診断｜あなたの仕事はAIに奪われる？それとも進化する？.pdf")
-    with tempfile.TemporaryDirectory() as path:
-        image_conv = convert_from_path(pdf_path, 600, output_folder=path)
-        st.session_state.base64_image = convert_image_to_base64(image_conv[0])
+
+    def build() -> str:
+        with tempfile.TemporaryDirectory() as path:
+            image_conv = convert_from_path(pdf_path, 600, output_folder=path)
+            return convert_image_to_base64(image_conv[0])
     
-    return st.session_state.base64_image
+    return get_shared_cache().get_or_create(
+        make_key("base64_image", pdf_path, os.path.getmtime(pdf_path)),
+        build,
+    )
 
 def get_ai_response(user_responses: dict[str, str], user_info: dict = None):
     """診断結果の生成"""
@@ -253,11 +261,20 @@ def get_ai_response(user_responses: dict[str, str], user_info: dict = None):
             ],
         },
     ]
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
+    def build() -> dict:
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages
+        )
+        return {
+            "text": response.choices[0].message.content
+        }
     
-    return {
-        "text": response.choices[0].message.content
-    }
\ No newline at end of file
+    # 画像は PDF から決まるため、キーには system_prompt と回答だけを含める
+    # 診断結果はユーザーごとに異なり大きいため、メモリ層には置かず共有層だけに保存する
+    # （メモリ上の参照は session_store だけにし、アイドル時の破棄で確実に解放されるようにする）
+    return get_shared_cache().get_or_create(
+        make_key("ai_response", "gpt-4o-mini", system_prompt, user_prompt),
+        build,
+        use_memory=False,
+    )
\ No newline at end of file
@@ -0,0 +1,81 @@
+# app/utils/session_store.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import streamlit as st
+
+# 診断結果を保持するセッション数の上限（超えた分は古いものから破棄）
+MAX_RESULT_SESSIONS = 200
+# 最終アクセスからこの秒数を過ぎた診断結果は破棄する
+RESULT_IDLE_TTL_SECONDS = 30 * 60
+
+# セッションキー -> (最終アクセス時刻, 診断結果)
+# st.session_state には参照キーだけを置き、大きな結果本体はここで一元管理する
+_results: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _session_key() -> str:
+    """セッションごとの参照キーを返す（未発行なら発行する）"""
+    if "result_key" not in st.session_state:
+        st.session_state.result_key = uuid.uuid4().hex
+    return st.session_state.result_key
+
+
+def evict_idle_results(now: Optional[float] = None) -> int:
+    """アイドル状態のセッションの診断結果を破棄する
+
+    Args:
+        now: 判定に使う現在時刻（省略時は time.time()）
+    Returns:
+        int: 破棄した件数
+    """
+    now = time.time() if now is None else now
+    evicted = 0
+    with _lock:
+        # 先頭ほど最終アクセスが古いので、TTL 内のものに当たった時点で終了
+        while _results:
+            key, (last_access, _) = next(iter(_results.items()))
+            if now - last_access <= RESULT_IDLE_TTL_SECONDS and len(_results) <= MAX_RESULT_SESSIONS:
+                break
+            del _results[key]
+            evicted += 1
+    return evicted
+
+
+def save_result(result: dict) -> None:
+    """現在のセッションの診断結果を保存する"""
+    key = _session_key()
+    with _lock:
+        _results[key] = (time.time(), result)
+        _results.move_to_end(key)
+    evict_idle_results()
+
+
+def load_result() -> Optional[dict]:
+    """現在のセッションの診断結果を返す（破棄済みなら None）"""
+    evict_idle_results()
+    key = _session_key()
+    with _lock:
+        entry = _results.get(key)
+        if entry is None:
+            return None
+        _results[key] = (time.time(), entry[1])
+        _results.move_to_end(key)
+        return entry[1]
+
+
+def clear_result() -> None:
+    """現在のセッションの診断結果を破棄する"""
+    key = _session_key()
+    with _lock:
+        _results.pop(key, None)
+
+
+def stored_result_count() -> int:
+    """保持中の診断結果の件数を返す"""
+    with _lock:
+        return len(_results)
@@ -0,0 +1,342 @@
+# app/utils/shared_cache.py
+"""ワーカープロセス間で共有するキャッシュ
+
+プロセス内のメモリ層と、共有ボリューム上の SQLite 層の 2 段構成。
+get_or_create() はキーごとのファイルロックで生成処理を直列化するため、
+複数ワーカーに同じリクエストが来ても生成（PDF 変換や LLM 呼び出し）は 1 回だけ行われ、
+他のワーカーはその結果を待って共有層から読み出す。
+
+共有層には JSON に変換できる値（文字列・dict・list など）だけを保存する。
+共有先のディレクトリは環境変数 SHARED_CACHE_DIR で指定する（全ワーカーで同じパスにする）。
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+# メモリ層に保持する件数の上限（超えた分は古いものから破棄）
+MEMORY_CACHE_MAX_ENTRIES = 128
+# 共有層の保存期間と合計サイズの上限（set() のたびに超えた分を古い順に削除）
+SHARED_CACHE_TTL_SECONDS = 24 * 60 * 60
+SHARED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# ロックファイルの数（キーのハッシュで割り当てるため、ファイル数はこれ以上増えない）
+# 別のキーが同じファイルに当たると互いの生成（LLM 呼び出し）を待つため、同時生成数より十分大きくする
+LOCK_POOL_SIZE = 4096
+# 他のワーカーの生成を待つ上限秒数（超えたらロックなしで生成する）
+LOCK_TIMEOUT_SECONDS = 120.0
+LOCK_POLL_SECONDS = 0.1
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    """名前空間と入力値からキャッシュキーを作成する
+
+    Args:
+        namespace: キャッシュ対象の種類（例: "markdown", "ai_response"）
+        parts: キーに含める値（JSON に変換できるもの）
+    Returns:
+        str: "<namespace>:<sha256>" 形式のキー
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def _ensure_private_dir(path: str) -> None:
+    """自分だけが書き込めるディレクトリを用意する（他人が作ったものは使わない）"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"キャッシュディレクトリの所有者が実行ユーザーではありません: {path}")
+    if info.st_mode & 0o022:
+        raise PermissionError(f"キャッシュディレクトリが他のユーザーから書き込み可能です: {path}")
+
+
+class CacheBackend(ABC):
+    """キャッシュ層の共通インターフェース"""
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        """キーに対応する値を返す（なければ default）"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """キーに値を保存する"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """キーの値を削除する"""
+
+
+class MemoryCache(CacheBackend):
+    """プロセス内のメモリ層（LRU で件数を制限）"""
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteCache(CacheBackend):
+    """共有ボリューム上の SQLite 層（値は JSON で保存）"""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = SHARED_CACHE_TTL_SECONDS,
+        max_bytes: int = SHARED_CACHE_MAX_BYTES,
+        timeout: float = 30.0,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at)")
+            # 旧形式（generation 列なし）の失敗テーブルは使わない
+            conn.execute("DROP TABLE IF EXISTS failures")
+            # generation はキーごとの失敗回数。待ち始めた時点の値と比べ、待っている間の失敗だけを検出する
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS build_failures ("
+                "key TEXT PRIMARY KEY, message TEXT NOT NULL, generation INTEGER NOT NULL, failed_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 接続は操作ごとに開く（プロセス・スレッド間で共有しない）
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        finally:
+            conn.close()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        text = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created_at) VALUES (?, ?, ?, ?)",
+                    (key, text, len(text.encode("utf-8")), now),
+                )
+                self._prune(conn, now)
+        finally:
+            conn.close()
+
+    def delete(self, key: str) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """期限切れの行を削除し、合計サイズが上限を超えていれば古い順に削除する"""
+        conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+        # ロック待ちは LOCK_TIMEOUT_SECONDS で打ち切るため、それより古い失敗を参照する待ち手はいない
+        conn.execute("DELETE FROM build_failures WHERE failed_at < ?", (now - 2 * LOCK_TIMEOUT_SECONDS,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY created_at").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def record_failure(self, key: str, message: str) -> None:
+        """生成に失敗したことを記録する（待っているワーカーに伝えるため）"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO build_failures (key, message, generation, failed_at) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET message = excluded.message, "
+                    "generation = generation + 1, failed_at = excluded.failed_at",
+                    (key, message, time.time()),
+                )
+        finally:
+            conn.close()
+
+    def failure(self, key: str) -> tuple[int, Optional[str]]:
+        """キーの失敗回数と最後の失敗メッセージを返す（失敗がなければ (0, None)）"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT generation, message FROM build_failures WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return (0, None) if row is None else (row[0], row[1])
+
+
+class TieredCache(CacheBackend):
+    """メモリ層と共有層をまとめ、プロセス間で生成処理を 1 回に絞るキャッシュ"""
+
+    def __init__(
+        self,
+        cache_dir: str,
+        memory: Optional[MemoryCache] = None,
+        lock_timeout: float = LOCK_TIMEOUT_SECONDS,
+    ):
+        self.cache_dir = cache_dir
+        self.lock_dir = os.path.join(cache_dir, "locks")
+        _ensure_private_dir(cache_dir)
+        _ensure_private_dir(self.lock_dir)
+        self.lock_timeout = lock_timeout
+        self.memory = memory if memory is not None else MemoryCache()
+        self.shared = SQLiteCache(os.path.join(cache_dir, "cache.sqlite3"))
+
+    def _lock_path(self, key: str) -> str:
+        # 別のキーが同じロックに当たると、そのキーの生成が終わるまで待たされる（結果は混ざらない）
+        slot = int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % LOCK_POOL_SIZE
+        return os.path.join(self.lock_dir, f"{slot}.lock")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """メモリ層 → 共有層の順に探し、共有層で見つかればメモリ層に載せる"""
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.shared.set(key, value)
+        self.memory.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.shared.delete(key)
+        self.memory.delete(key)
+
+    def _acquire(self, lock_file) -> bool:
+        """ロックを取得する（lock_timeout 秒以内に取れなければ False）"""
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_SECONDS)
+
+    def _lookup(self, key: str, use_memory: bool) -> Any:
+        return self.get(key, _MISSING) if use_memory else self.shared.get(key, _MISSING)
+
+    def _build(self, key: str, builder: Callable[[], Any], use_memory: bool) -> Any:
+        try:
+            value = builder()
+        except Exception as e:
+            try:
+                self.shared.record_failure(key, str(e))
+            except sqlite3.Error:
+                logger.warning("生成失敗の記録に失敗しました: %s", key, exc_info=True)
+            raise
+        if use_memory:
+            self.memory.set(key, value)
+        # 共有層は最適化のため、書き込めなくても生成した値はそのまま返す
+        try:
+            self.shared.set(key, value)
+        except (sqlite3.Error, OSError, TypeError, ValueError):
+            logger.warning("共有キャッシュへの書き込みに失敗しました: %s", key, exc_info=True)
+        return value
+
+    def get_or_create(self, key: str, builder: Callable[[], Any], use_memory: bool = True) -> Any:
+        """キャッシュ済みの値を返し、なければ builder() で生成して保存する
+
+        同じキーの生成はファイルロックで直列化する。ロックを取れなかったワーカーは
+        生成が終わるまで待ち、共有層に保存された結果をそのまま使う。
+        待ち時間が lock_timeout を超えた場合はロックなしで生成する。
+        待っている間に実行されていた生成が失敗した場合は、再実行せずに RuntimeError を送出する
+        （失敗の後に来たリクエストは通常どおり生成する）。
+
+        Args:
+            key: キャッシュキー（make_key() で作成）
+            builder: 値を生成する関数（戻り値は JSON に変換できること）
+            use_memory: False ならメモリ層を使わず共有層だけに保存する（ユーザーごとの大きな値向け）
+        Returns:
+            Any: キャッシュ済みまたは生成した値
+        """
+        value = self._lookup(key, use_memory)
+        if value is not _MISSING:
+            return value
+
+        generation, _ = self.shared.failure(key)
+        with open(self._lock_path(key), "a+b") as lock_file:
+            if not self._acquire(lock_file):
+                # 生成中のワーカーが応答しない場合でも、このワーカーは待ち続けない
+                value = self._lookup(key, use_memory)
+                if value is not _MISSING:
+                    return value
+                return self._build(key, builder, use_memory)
+            try:
+                # 待っている間に他のワーカーが生成済みならそれを使う
+                value = self._lookup(key, use_memory)
+                if value is not _MISSING:
+                    return value
+                latest_generation, message = self.shared.failure(key)
+                if latest_generation > generation:
+                    raise RuntimeError(f"同じ内容の生成が失敗しました: {message}")
+                return self._build(key, builder, use_memory)
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+_default_cache: Optional[TieredCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> TieredCache:
+    """SHARED_CACHE_DIR を使うプロセス共通のキャッシュを返す"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            cache_dir = os.getenv("SHARED_CACHE_DIR") or os.path.join(
+                tempfile.gettempdir(), f"ai-survival-diagnostic-cache-{os.getuid()}"
+            )
+            _default_cache = TieredCache(cache_dir)
+        return _default_cache